@@ -0,0 +1,12 @@
+# _traci.py
+"""
+Single place that picks the SUMO client used by the whole package.
+
+SUMO_LIBSUMO=1 (or the older USE_LIBSUMO=1) swaps the TraCI socket client
+for in-process libsumo, which exposes the same API without a TCP round-trip
+per call. libsumo has no sumo-gui, so GUI runs need the socket client.
+"""
+import os
+
+LIBSUMO = bool(os.environ.get("SUMO_LIBSUMO") or os.environ.get("USE_LIBSUMO"))
+traci = __import__("libsumo" if LIBSUMO else "traci")
@@ -1,33 +1,77 @@
 # attacks.py
+import logging
 import random
-import traci
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
 
-def emergency_brake(state, vehicle_id, stop_position, emergency_deceleration):
+import numpy as np
+from traci import constants as tc
+
+from ._traci import traci
+
+logger = logging.getLogger(__name__)
+
+# type-ID substring marking connected/automated vehicles; the runner keeps
+# an incremental set of them under this key of its type index
+CAV_TYPE = "CAV"
+
+def veh_type(types, vid):
+    """
+    Returns the type ID of `vid`, asking SUMO only the first time.
+
+    `types` is the caller's per-run cache (vehicle ID -> type ID), kept in
+    the attack's state: a vehicle's type never changes during a run, but
+    IDs repeat across seeds with different types, so it must not outlive
+    the run.
+    """
+    vtype = types.get(vid)
+    if vtype is None:
+        vtype = types[vid] = traci.vehicle.getTypeID(vid)
+    return vtype
+
+def emergency_brake(state, vehicle_id, stop_position, emergency_deceleration,
+                    step_ctx=None):
     """
     Emergency brake attack:
       - Monitors the specified vehicle_id.
       - When that vehicle reaches stop_position (meters), force it to a full stop.
     State keys:
       - attack_success: bool (has the attack completed?)
+    `step_ctx` is the runner's per-step context; its 'subs' (vehicle
+    subscription results) give presence, position and speed without the
+    getIDList/getLanePosition/getSpeed calls.
+
+    Returns True once the brake has been applied, so the caller can stop
+    calling it.
     """
     # Initialize state
     state.setdefault('attack_success', False)
 
     # If already done, nothing more to do
     if state['attack_success']:
+        return True
+
+    if step_ctx is not None:
+        v = step_ctx['subs'].get(vehicle_id)
+        if v is None:
+            return
+        pos, speed = v[tc.VAR_LANEPOSITION], v[tc.VAR_SPEED]
+    elif vehicle_id in traci.vehicle.getIDList():
+        pos = traci.vehicle.getLanePosition(vehicle_id)
+        speed = traci.vehicle.getSpeed(vehicle_id)
+    else:
         return
 
-    # If the vehicle is still in the simulation
-    if vehicle_id in traci.vehicle.getIDList():
-        pos = traci.vehicle.getLanePosition(vehicle_id)
-        if pos >= stop_position:
-            traci.vehicle.setSpeedMode(vehicle_id, 0)
-            traci.vehicle.setLaneChangeMode(vehicle_id, 0)
-            time_to_stop = traci.vehicle.getSpeed('ego') / abs(emergency_deceleration)
-            # Apply emergency brake
-            traci.vehicle.slowDown(vehicle_id, 0.0, time_to_stop)
-            state['attack_success'] = True
-            print(f"[attack] Emergency brake applied to {vehicle_id} at {pos:.2f} m")
+    # The vehicle is still in the simulation
+    if pos >= stop_position:
+        traci.vehicle.setSpeedMode(vehicle_id, 0)
+        traci.vehicle.setLaneChangeMode(vehicle_id, 0)
+        time_to_stop = speed / abs(emergency_deceleration)
+        # Apply emergency brake
+        traci.vehicle.slowDown(vehicle_id, 0.0, time_to_stop)
+        state['attack_success'] = True
+        logger.debug("Emergency brake applied to %s at %.2f m", vehicle_id, pos)
+        return True
 
 def rear_end_collision(
     state,
@@ -35,7 +79,9 @@ def rear_end_collision(
     aggressive_accel,
     target_vehicles=None,
     target_type=None,
-    leader_gap=250
+    vehicles=None,
+    leader_gap=250,
+    step_ctx=None
 ):
     """
     Rear end collision by aggresive acceleration:
@@ -46,10 +92,24 @@ def rear_end_collision(
     Args:
       state (dict): shared dict across timesteps. Will get:
         state['attack_success'] = { vehicle_id: bool, ... }
+        state['armed'] = { vehicle_id, ... } (safety checks already disabled)
+        state['done'] = { vehicle_id, ... } (collided or left the sim)
+        state['pending'] = { vehicle_id, ... } (explicit targets not yet done)
+        state['types'] = { vehicle_id: type_id, ... } (type cache of the
+          fallback scan, see veh_type)
       aggressive_accel (float): acceleration (m/s²) to apply.
       target_vehicles (str or list[str], optional): exact vehicle ID(s) to target.
       target_type (str, optional): substring to match in traci.vehicle.getTypeID().
+      vehicles (set[str], optional): precomputed IDs matching target_type
+        (the runner's type index); skips the per-step type scan.
       leader_gap (float): look‐ahead distance (m) for traci.vehicle.getLeader.
+      step_ctx (dict, optional): runner's per-step context; its 'ids' set
+        and 'collisions_by_collider' map replace traci.vehicle.getIDList()
+        and traci.simulation.getCollisions() calls.
+
+    Returns:
+      bool: True once every explicit target is done (never for target_type,
+        whose matching vehicles keep departing).
 
     Raises:
       ValueError: if neither target_vehicles nor target_type is provided.
@@ -60,73 +120,141 @@ def rear_end_collision(
 
     # Initialize per-vehicle success map
     success_map = state.setdefault('attack_success', {})
+    armed = state.setdefault('armed', set())
+    done = state.setdefault('done', set())
+
+    # Vehicles currently in the simulation (fetched once per step)
+    ids = (step_ctx['ids'] if step_ctx is not None
+           else frozenset(traci.vehicle.getIDList()))
+    # This step's collisions keyed by collider (fetched once per step)
+    if step_ctx is not None:
+        by_collider = step_ctx['collisions_by_collider']
+    else:
+        by_collider = {}
+        for coll in traci.simulation.getCollisions():
+            by_collider.setdefault(coll.collider, coll)
 
-    # Determine which vehicles to target
+    # Determine which vehicles still need attacking; completed ones are
+    # never revisited
     if target_vehicles is not None:
-        vehicles = ([target_vehicles] if isinstance(target_vehicles, str)
-                    else list(target_vehicles))
+        pending = state.get('pending')
+        if pending is None:
+            pending = state['pending'] = set(
+                [target_vehicles] if isinstance(target_vehicles, str)
+                else target_vehicles)
     else:
-        vehicles = [
-            vid for vid in traci.vehicle.getIDList()
-            if target_type in traci.vehicle.getTypeID(vid)
-        ]
-
-    # Apply attack for each vehicle
-    for vid in vehicles:
-        # Initialize flag
-        success_map.setdefault(vid, False)
-        if success_map[vid]:
-            continue  # already done
+        if vehicles is None:
+            types = state.setdefault('types', {})
+            vehicles = [vid for vid in ids if target_type in veh_type(types, vid)]
+        pending = set(vehicles).difference(done)
 
+    # Bind the hot-loop TraCI calls once
+    setAccel, setSpeed = traci.vehicle.setAcceleration, traci.vehicle.setSpeed
+    setSpeedMode, setLCMode = traci.vehicle.setSpeedMode, traci.vehicle.setLaneChangeMode
+
+    # Apply attack for each vehicle (copy: finished ones are discarded)
+    for vid in list(pending):
         # If vehicle has left the sim, mark done
-        if vid not in traci.vehicle.getIDList():
+        if vid not in ids:
             success_map[vid] = True
+            done.add(vid)
+            pending.discard(vid)
             continue
 
-        # Disable safety checks and apply acceleration
-        traci.vehicle.setSpeedMode(vid, 0)
-        traci.vehicle.setLaneChangeMode(vid, 0)
-        traci.vehicle.setAcceleration(vid, aggressive_accel, 1)
+        # Disable safety checks once (sticky), then apply acceleration
+        if vid not in armed:
+            setSpeedMode(vid, 0)
+            setLCMode(vid, 0)
+            armed.add(vid)
+            success_map[vid] = False
+        setAccel(vid, aggressive_accel, 1)
 
         # Check for collisions this step
-        for coll in traci.simulation.getCollisions():
-            if coll.collider == vid:
-                victim = coll.victim
-                # Halt both vehicles
-                for v in (vid, victim):
-                    traci.vehicle.setAcceleration(v, 0, 0)
-                    traci.vehicle.setSpeed(v, 0)
-                    traci.vehicle.setSpeedMode(v, -1)
-                    traci.vehicle.setLaneChangeMode(v, -1)
-                success_map[vid] = True
-                print(f"[attack] Collision: {vid} -> {victim}")
-                break
+        coll = by_collider.get(vid)
+        if coll is not None:
+            victim = coll.victim
+            # Halt both vehicles
+            for v in (vid, victim):
+                setAccel(v, 0, 0)
+                setSpeed(v, 0)
+                setSpeedMode(v, -1)
+                setLCMode(v, -1)
+            success_map[vid] = True
+            done.add(vid)
+            pending.discard(vid)
+            logger.debug("Collision: %s -> %s", vid, victim)
+
+    # explicit targets are a fixed list: once all are done, so is the attack
+    return target_vehicles is not None and not pending
 
 def lane_closure(state,
+                 vehicles=None,
                  lane_id='E0_0',
                  merge_to_lane=1,
                  detection_min=3000,
-                 detection_max=3500):
+                 detection_max=3500,
+                 by_lane=None,
+                 step_ctx=None):
     """
     Lane closure attack:
       - For every CAV in `lane_id` within the detection zone, force a lane change.
       - If past the zone, force a stop then merge.
-    State isn’t used here but kept for API consistency.
+    State keys:
+      - held: set of vehicle IDs stopped by the attack and not yet released
+      - requested: set of vehicle IDs on `lane_id` with a lane-change request
+
+    `vehicles` are the CAV IDs from the runner's type index; when omitted
+    they are filtered from the subscriptions. Lane/position are read from the
+    per-vehicle subscriptions set up by metrics.track_vehicles() (the
+    runner's `step_ctx['subs']` when given); `by_lane` may pass an already
+    built _lane_index() of those vehicles.
+
+    Stops, releases and a vehicle's first lane-change request happen on the
+    step it qualifies; renewing a pending (2 s) request is left to the steps
+    where `step_ctx['refresh']` is true.
     """
-    for vid in traci.vehicle.getIDList():
-        if 'CAV' in traci.vehicle.getTypeID(vid):
-            cur_lane = traci.vehicle.getLaneID(vid)
-            pos = traci.vehicle.getLanePosition(vid)
-
-            if cur_lane == lane_id:
-                if detection_min <= pos < detection_max:
-                    traci.vehicle.changeLane(vid, merge_to_lane, duration=2)
-                elif pos >= detection_max:
-                    traci.vehicle.setSpeed(vid, 0.0)
-                    traci.vehicle.changeLane(vid, merge_to_lane, duration=2)
-            else:
-                # Release to free speed once merged
-                traci.vehicle.setSpeed(vid, -1)
+    refresh = step_ctx is None or step_ctx.get('refresh', True)
+    if by_lane is None:
+        subs = _subs(step_ctx)
+        if vehicles is None:
+            vehicles = _cavs(subs)
+        by_lane = _lane_index(subs, vehicles)
+
+    changeLane, setSpeed = traci.vehicle.changeLane, traci.vehicle.setSpeed
+
+    # On the closed lane: range-query the detection zone and the stretch past it
+    closed = by_lane.get(lane_id, ())
+    lo = bisect_left(closed, detection_min, key=_POS)
+    hi = bisect_left(closed, detection_max, key=_POS)
+    # vehicles with a lane-change request issued while on the closed lane;
+    # one that leaves it is dropped, so a return gets a fresh request
+    requested = state.setdefault('requested', set())
+    requested.intersection_update(vid for _, vid in closed[lo:])
+    for _, vid in closed[lo:hi]:
+        if refresh or vid not in requested:
+            changeLane(vid, merge_to_lane, duration=2)
+            requested.add(vid)
+    held = state.setdefault('held', set())
+    for _, vid in closed[hi:]:
+        if vid not in held:
+            setSpeed(vid, 0.0)
+            held.add(vid)
+            changeLane(vid, merge_to_lane, duration=2)
+            requested.add(vid)
+        elif refresh or vid not in requested:
+            changeLane(vid, merge_to_lane, duration=2)
+            requested.add(vid)
+
+    if not held:
+        return
+    for lane, entries in by_lane.items():
+        if lane == lane_id:
+            continue
+        # Release to free speed once merged (only vehicles we stopped)
+        for _, vid in entries:
+            if vid in held:
+                setSpeed(vid, -1)
+                held.discard(vid)
 
 def vsl_control(
     state,
@@ -134,7 +262,9 @@ def vsl_control(
     zone_min,
     zone_max,
     default_speed_mps=55.56,
-    max_deceleration_m_s2=-3.0
+    max_deceleration_m_s2=-3.0,
+    vehicles=None,
+    step_ctx=None
 ):
     """
     Variable Speed Limit (VSL) control for CAVs in a specific zone.
@@ -142,11 +272,17 @@ def vsl_control(
     Args:
       state (dict): shared dict across timesteps. Will get/keep:
         state['slowing_vehicles'] = { vehicle_id: target_speed, ... }
+        state['max_speed'] = { vehicle_id: m/s, ... } (last max speed set;
+          setMaxSpeed is only re-issued when the value changes)
       vsl_mph (float): target speed limit in the zone (mph)
       zone_min (float): meter position where zone begins
       zone_max (float): meter position where zone ends
       default_speed_mps (float): speed to restore when outside zone (m/s)
       max_deceleration_m_s2 (float): used to compute slowdown duration
+      vehicles (set[str], optional): CAV IDs from the runner's type index;
+        when omitted they are filtered from the vehicle subscriptions.
+      step_ctx (dict, optional): runner's per-step context; its 'subs'
+        replace the getAllSubscriptionResults() call.
 
     Behavior:
       - For each CAV in the zone, if its current speed > target, issues
@@ -155,35 +291,44 @@ def vsl_control(
       - Vehicles leaving the zone get their max speed reset, and are
         removed from the slowing_vehicles tracker.
     """
-    # prepare state tracker
+    # prepare state trackers
     sl = state.setdefault('slowing_vehicles', {})
+    capped = state.setdefault('max_speed', {})
 
     # convert mph → m/s once
     target_speed = vsl_mph * 0.44704
 
-    for vid in traci.vehicle.getIDList():
+    # position/speed come from metrics.track_vehicles() subscriptions
+    subs = _subs(step_ctx)
+    if vehicles is None:
         # only affect CAV types
-        if 'CAV' not in traci.vehicle.getTypeID(vid):
-            continue
-
-        pos = traci.vehicle.getLanePosition(vid)
-        curr_speed = traci.vehicle.getSpeed(vid)
-
-        # inside the VSL zone?
-        if zone_min < pos < zone_max:
-            if curr_speed > target_speed:
-                # compute time to decelerate
-                decel_time = (curr_speed - target_speed) / abs(max_deceleration_m_s2)
-                traci.vehicle.slowDown(vid, target_speed, decel_time)
-                sl[vid] = target_speed
-            else:
-                # already at or below target: enforce it
-                traci.vehicle.setMaxSpeed(vid, target_speed)
-        else:
-            # outside zone: restore default
-            traci.vehicle.setMaxSpeed(vid, default_speed_mps)
-            # clean up tracker
-            sl.pop(vid, None)
+        vehicles = _cavs(subs)
+
+    # pull positions/speeds into arrays and classify every vehicle at once
+    vids = np.array(list(vehicles), dtype=object)
+    pos = np.fromiter((subs[v][tc.VAR_LANEPOSITION] for v in vids),
+                      dtype=np.float64, count=len(vids))
+    speeds = np.fromiter((subs[v][tc.VAR_SPEED] for v in vids),
+                         dtype=np.float64, count=len(vids))
+    in_zone = (pos > zone_min) & (pos < zone_max)
+    slowing = in_zone & (speeds > target_speed)
+
+    slowDown = traci.vehicle.slowDown
+
+    # inside the zone and too fast: ramp down over the computed time
+    decel_times = _decel_times(speeds[slowing], target_speed, max_deceleration_m_s2)
+    for vid, decel_time in zip(vids[slowing], decel_times):
+        slowDown(vid, target_speed, float(decel_time))
+        sl[vid] = target_speed
+
+    # already at or below target: enforce it
+    _set_max_speed(vids[in_zone & ~slowing], target_speed, capped)
+
+    # outside zone: restore default and clean up tracker
+    outside = vids[~in_zone]
+    _set_max_speed(outside, default_speed_mps, capped)
+    for vid in outside:
+        sl.pop(vid, None)
 
 def set_target_speed(
     state,
@@ -192,16 +337,26 @@ def set_target_speed(
     *,
     target_vehicles=None,
     target_type=None,
+    vehicles=None,
+    step_ctx=None,
 ):
     """
     Override vehicle speeds by commanding acceleration/deceleration toward a target.
 
     Args:
-      state (dict): shared dict across timesteps (unused here, but for API consistency).
+      state (dict): shared dict across timesteps. Will get:
+        state['armed'] = { vehicle_id, ... } (safety checks already disabled)
+        state['max_speed'] = { vehicle_id: m/s, ... } (last max speed set)
+        state['types'] = { vehicle_id: type_id, ... } (type cache of the
+          fallback scan, see veh_type)
       target_speed_mps (float): desired speed in m/s.
       accel_rate_m_s2 (float): positive for acceleration, will be negated for deceleration.
       target_vehicles (str | list[str], optional): exact vehicle ID(s) to target.
       target_type (str, optional): substring to match in vehicle type IDs.
+      vehicles (set[str], optional): precomputed IDs matching target_type
+        (the runner's type index); skips the per-step type scan.
+      step_ctx (dict, optional): runner's per-step context; its 'ids' set
+        and 'subs' replace traci.vehicle.getIDList() and getSpeed() calls.
 
     Raises:
       ValueError: if neither target_vehicles nor target_type is provided.
@@ -209,6 +364,10 @@ def set_target_speed(
     if target_vehicles is None and target_type is None:
         raise ValueError("Must provide target_vehicles or target_type")
 
+    # Vehicles currently in the simulation (fetched once per step)
+    ids = (step_ctx['ids'] if step_ctx is not None
+           else frozenset(traci.vehicle.getIDList()))
+
     # build list of IDs
     if target_vehicles is not None:
         vids = (
@@ -216,65 +375,146 @@ def set_target_speed(
             if isinstance(target_vehicles, str)
             else list(target_vehicles)
         )
+    elif vehicles is not None:
+        vids = vehicles
     else:
-        vids = [
-            vid for vid in traci.vehicle.getIDList()
-            if target_type in traci.vehicle.getTypeID(vid)
-        ]
+        types = state.setdefault('types', {})
+        vids = [vid for vid in ids if target_type in veh_type(types, vid)]
+
+    # Bind the hot-loop TraCI calls once
+    if step_ctx is not None:
+        subs = step_ctx['subs']
+        getSpeed = lambda vid: subs[vid][tc.VAR_SPEED]
+    else:
+        getSpeed = traci.vehicle.getSpeed
+    setAccel, slowDown, setMaxSpeed = (
+        traci.vehicle.setAcceleration, traci.vehicle.slowDown,
+        traci.vehicle.setMaxSpeed)
+    setSpeedMode, setLCMode = traci.vehicle.setSpeedMode, traci.vehicle.setLaneChangeMode
+
+    armed = state.setdefault('armed', set())
+    capped = state.setdefault('max_speed', {})
 
     for vid in vids:
-        if vid not in traci.vehicle.getIDList():
+        if vid not in ids:
             continue
 
         # disable safety checks so our speed commands take effect immediately
-        traci.vehicle.setSpeedMode(vid, 0)
-        traci.vehicle.setLaneChangeMode(vid, 0)
+        # (sticky: issued once per vehicle)
+        if vid not in armed:
+            setSpeedMode(vid, 0)
+            setLCMode(vid, 0)
+            armed.add(vid)
 
-        curr = traci.vehicle.getSpeed(vid)
+        curr = getSpeed(vid)
         # decide accelerate vs decelerate
         if curr < target_speed_mps:
             # accelerate up to target
-            traci.vehicle.setAcceleration(vid, accel_rate_m_s2, 1)
+            setAccel(vid, accel_rate_m_s2, 1)
         elif curr > target_speed_mps:
             # decelerate down to target
             decel = -abs(accel_rate_m_s2)
             duration = (curr - target_speed_mps) / abs(decel) if decel != 0 else 0
             if duration > 0:
-                traci.vehicle.slowDown(vid, target_speed_mps, duration)
+                slowDown(vid, target_speed_mps, duration)
 
-        # enforce an upper bound so they don’t overshoot
-        traci.vehicle.setMaxSpeed(vid, target_speed_mps)
+        # enforce an upper bound so they don’t overshoot (sticky as well)
+        if capped.get(vid) != target_speed_mps:
+            setMaxSpeed(vid, target_speed_mps)
+            capped[vid] = target_speed_mps
 
 def rsu_spoofing(
     state,
     *,
-    vsl_sched,          # list[(t0,t1,speed_mph), …]
+    vsl_sched,          # (starts, ends, speed_mph) tuples sorted by start
     lane_close_t,       # time (s) to start closure
     zone,               # (min_m, max_m) where VSL applies
+    vehicles=None,      # CAV IDs from the runner's type index
+    step_ctx=None,      # runner's per-step context (sim_time, ids, subs, refresh)
+    zone_edge=None,     # edge holding the zone; None scans all lanes
     **lc_kwargs         # forwarded to existing lane_closure()
 ):
     """Combined VSL schedule + lane-closure attack."""
-    cur_t = traci.simulation.getTime()
+    cur_t = (step_ctx['sim_time'] if step_ctx is not None
+             else traci.simulation.getTime())
+
+    # active window: last start < cur_t, still open (t0 < cur_t <= t1);
+    # applied every step, _set_max_speed skips caps already in place
+    starts, ends, mphs = vsl_sched
+    i = bisect_left(starts, cur_t) - 1
+    vsl_active = i >= 0 and cur_t <= ends[i]
+    closing = cur_t >= lane_close_t
+    if not (vsl_active or closing):
+        return
+
+    subs = _subs(step_ctx)
+    if vehicles is None:
+        vehicles = set(_cavs(subs))
+    by_lane = None
 
     # 1) VARIABLE SPEED LIMIT --------------------------------
-    vids = [
-        vid for vid in traci.vehicle.getIDList()
-        if "CAV" in traci.vehicle.getTypeID(vid)
-           and zone[0] < traci.vehicle.getLanePosition(vid) < zone[1]
-    ]
-    for t0, t1, mph in vsl_sched:
-        if t0 < cur_t <= t1:
-            _vsl_step(vids, mph)
+    if vsl_active:
+        if zone_edge is not None:
+            # only the vehicles on the zone's edge (one call), positions
+            # from the per-vehicle subscriptions
+            zmin, zmax = zone
+            vids = [vid for vid in traci.edge.getLastStepVehicleIDs(zone_edge)
+                    if vid in vehicles
+                    and zmin < subs[vid][tc.VAR_LANEPOSITION] < zmax]
+        else:
+            by_lane = _lane_index(subs, vehicles)
+            vids = []
+            for entries in by_lane.values():
+                lo = bisect_right(entries, zone[0], key=_POS)
+                hi = bisect_left(entries, zone[1], key=_POS)
+                vids.extend(vid for _, vid in entries[lo:hi])
+        _vsl_step(vids, mphs[i], state.setdefault('max_speed', {}))
 
     # 2) LANE CLOSURE ----------------------------------------
-    if cur_t >= lane_close_t:
-        lane_closure(state, **lc_kwargs)
+    if closing:
+        if by_lane is None:
+            by_lane = _lane_index(subs, vehicles)
+        lane_closure(state, vehicles, by_lane=by_lane, step_ctx=step_ctx,
+                     **lc_kwargs)
 
 
 # ────────────────────────────────────────────────────────────
-def _vsl_step(vehicle_ids, target_mph):
+_POS = itemgetter(0)
+
+def _subs(step_ctx):
+    """Internal helper: this step's vehicle subscription results."""
+    if step_ctx is not None:
+        return step_ctx['subs']
+    return traci.vehicle.getAllSubscriptionResults()
+
+def _cavs(subs):
+    """Internal helper: CAV IDs among the subscribed vehicles (fallback scan)."""
+    return [vid for vid, v in subs.items() if CAV_TYPE in v[tc.VAR_TYPE]]
+
+def _decel_times(speeds, target_speed, max_deceleration):
+    """Internal helper: seconds to slow each speed (array) to target_speed."""
+    return (speeds - target_speed) / abs(max_deceleration)
+
+def _lane_index(subs, vehicle_ids):
+    """Internal helper: {lane_id: [(lane_pos, vid), …] sorted by position}."""
+    by_lane = {}
+    for vid in vehicle_ids:
+        v = subs[vid]
+        by_lane.setdefault(v[tc.VAR_LANE_ID], []).append((v[tc.VAR_LANEPOSITION], vid))
+    for entries in by_lane.values():
+        entries.sort()
+    return by_lane
+
+def _vsl_step(vehicle_ids, target_mph, applied):
     """Internal helper: set max-speed of given vehicles to target_mph."""
     target = target_mph * 0.44704          # mph → m/s
+    _set_max_speed(vehicle_ids, target, applied)
+
+def _set_max_speed(vehicle_ids, speed, applied):
+    """Internal helper: setMaxSpeed where it differs from `applied` (vid → m/s)."""
+    setMaxSpeed = traci.vehicle.setMaxSpeed
     for vid in vehicle_ids:
-        traci.vehicle.setMaxSpeed(vid, target)
+        if applied.get(vid) != speed:
+            setMaxSpeed(vid, speed)
+            applied[vid] = speed
 # ────────────────────────────────────────────────────────────
\ No newline at end of file
@@ -1,13 +1,110 @@
 # metrics.py
 
-import traci
+import numpy as np
+from traci import constants as tc
+
+from ._traci import traci
+
+# Per-vehicle variables pushed by SUMO each step (read via getAllSubscriptionResults)
+VEHICLE_VARS = (tc.VAR_TYPE, tc.VAR_LANE_ID, tc.VAR_LANEPOSITION, tc.VAR_SPEED,
+                tc.VAR_ACCELERATION)
+
+# Simulation variables pushed each step (time plus departed/arrived IDs)
+SIMULATION_VARS = (tc.VAR_TIME, tc.VAR_DEPARTED_VEHICLES_IDS,
+                   tc.VAR_ARRIVED_VEHICLES_IDS)
+
+
+def subscribe_simulation():
+    """
+    Subscribes to the simulation time and departed/arrived vehicle IDs.
+
+    Call once after traci.start() or traci.load(); track_vehicles() then
+    reads them back with a single call per step.
+    """
+    traci.simulation.subscribe(SIMULATION_VARS)
+
+
+def track_vehicles(live, type_index):
+    """
+    Keeps the live-vehicle set and type index in step with the simulation.
+
+    Call once per step right after traci.simulationStep(), with
+    subscribe_simulation() in place. Departing vehicles are subscribed to
+    VEHICLE_VARS and their type (from the subscription, so no extra call)
+    is matched once against each key of `type_index`; arrived vehicles are
+    dropped. SUMO discards the subscriptions of arrived vehicles on its own,
+    so no unsubscribe is needed.
+
+    Args:
+      live (set[str]): IDs of vehicles currently in the simulation.
+      type_index (dict[str, set[str]]): type substring -> matching vehicle IDs.
+
+    Returns:
+      dict: this step's simulation subscription results (SIMULATION_VARS).
+    """
+    sim_res = traci.simulation.getSubscriptionResults()
+    subscribe, getSubscriptionResults = (traci.vehicle.subscribe,
+                                         traci.vehicle.getSubscriptionResults)
+    for vid in sim_res[tc.VAR_DEPARTED_VEHICLES_IDS]:
+        subscribe(vid, VEHICLE_VARS)
+        vtype = getSubscriptionResults(vid)[tc.VAR_TYPE]
+        live.add(vid)
+        for key, ids in type_index.items():
+            if key in vtype:
+                ids.add(vid)
+
+    arrived = sim_res[tc.VAR_ARRIVED_VEHICLES_IDS]
+    if arrived:
+        live.difference_update(arrived)
+        for ids in type_index.values():
+            ids.difference_update(arrived)
+    return sim_res
+
+
+def subscribe_detectors(det_ids):
+    """
+    Subscribes lane‐area detectors to their last-step vehicle count.
+
+    Call once after traci.start(); SUMO then pushes every count with the
+    step result, read back by detector_counts().
+    """
+    for det in det_ids:
+        traci.lanearea.subscribe(det, (tc.LAST_STEP_VEHICLE_NUMBER,))
+
+
+def detector_counts(det_ids):
+    """
+    Reads the subscribed vehicle counts of `det_ids`, in that order.
+
+    Returns:
+      np.ndarray[int64]: one count per detector.
+    """
+    res = traci.lanearea.getAllSubscriptionResults()
+    return np.fromiter(
+        (res[det][tc.LAST_STEP_VEHICLE_NUMBER] for det in det_ids),
+        dtype=np.int64, count=len(det_ids))
+
+
+def density_veh_km(count, length_m=100.0):
+    """
+    Converts detector vehicle counts to densities in veh/km.
+
+    Works element-wise on NumPy arrays as well as on scalars, so a whole
+    poll's counts can be converted in one call.
+    """
+    # density = vehicles per meter * 1000 → veh/km
+    return (count / length_m) * 1000.0
+
 
 def poll_detectors(det_ids):
     """
     Polls lane‐area detectors for vehicle counts and densities.
 
+    Reads the counts pushed by subscribe_detectors() in one call instead of
+    one getLastStepVehicleNumber() round-trip per detector.
+
     Args:
-      det_ids (list[str]): IDs of laneAreaDetector objects.
+      det_ids (list[str]): IDs of subscribed laneAreaDetector objects.
 
     Returns:
       List[tuple]: Each tuple is
@@ -16,63 +113,85 @@ def poll_detectors(det_ids):
          vehicle_count: int,
          density_veh_per_km: float)
     """
-    rows = []
     t = traci.simulation.getTime()
-    for det in det_ids:
-        count = traci.lanearea.getLastStepVehicleNumber(det)
-        # density = vehicles per meter * 1000 → veh/km
-        density = (count / 100.0) * 1000
-        rows.append((t, det, count, density))
-    return rows
+    counts = detector_counts(det_ids)
+    return list(zip([t] * len(det_ids), det_ids, counts.tolist(),
+                    density_veh_km(counts).tolist()))
 
 
-def poll_brakes(threshold):
+def poll_brakes(threshold, step_ctx=None, tag=()):
     """
     Detects emergency braking events by acceleration threshold.
 
     Args:
       threshold (float): acceleration (m/s²) below which we consider an
                          emergency brake.
+      step_ctx (dict, optional): runner's per-step context; its 'sim_time'
+                         and 'subs' (vehicle subscription results) replace
+                         the per-vehicle TraCI calls.
+      tag (tuple): extra columns appended to every row (e.g. (mode, seed)).
 
-    Returns:
-      List[tuple]: Each tuple is
-        (time_s: float,
-         vehicle_id: str,
-         acceleration_m_s2: float)
+    Yields:
+      tuple: (time_s: float,
+              vehicle_id: str,
+              acceleration_m_s2: float,
+              *tag)
     """
-    rows = []
+    if step_ctx is not None:
+        # compare all subscribed accelerations at once, then emit only the
+        # (few) vehicles below the threshold
+        t, subs = step_ctx['sim_time'], step_ctx['subs']
+        n = len(subs)
+        if not n:
+            return
+        vids = np.fromiter(subs.keys(), dtype=object, count=n)
+        accs = np.fromiter((v[tc.VAR_ACCELERATION] for v in subs.values()),
+                           dtype=np.float64, count=n)
+        below = accs < threshold
+        if below.any():
+            for vid, acc in zip(vids[below], accs[below].tolist()):
+                yield (t, vid, acc, *tag)
+        return
+
     t = traci.simulation.getTime()
+    getAcceleration = traci.vehicle.getAcceleration
     for vid in traci.vehicle.getIDList():
-        acc = traci.vehicle.getAcceleration(vid)
+        acc = getAcceleration(vid)
         if acc < threshold:
-            rows.append((t, vid, acc))
-    return rows
+            yield (t, vid, acc, *tag)
 
 
-def poll_collisions():
+def poll_collisions(step_ctx=None, tag=()):
     """
     Retrieves all collisions that occurred this timestep.
 
-    Returns:
-      List[tuple]: Each tuple is
-        (time_s: float,
-         collider_id: str,
-         victim_id: str,
-         collider_speed_m_s: float,
-         victim_speed_m_s: float,
-         lane_id: str,
-         position_m: float)
-    """
-    rows = []
-    t = traci.simulation.getTime()
-    for coll in traci.simulation.getCollisions():
-        rows.append((
+    Args:
+      step_ctx (dict, optional): runner's per-step context; its 'sim_time'
+                         and 'collisions' replace the TraCI calls.
+      tag (tuple): extra columns appended to every row (e.g. (mode, seed)).
+
+    Yields:
+      tuple: (time_s: float,
+              collider_id: str,
+              victim_id: str,
+              collider_speed_m_s: float,
+              victim_speed_m_s: float,
+              lane_id: str,
+              position_m: float,
+              *tag)
+    """
+    if step_ctx is not None:
+        t, collisions = step_ctx['sim_time'], step_ctx['collisions']
+    else:
+        t, collisions = traci.simulation.getTime(), traci.simulation.getCollisions()
+    for coll in collisions:
+        yield (
             t,
             coll.collider,
             coll.victim,
             coll.colliderSpeed,
             coll.victimSpeed,
             coll.lane,
-            coll.pos
-        ))
-    return rows
+            coll.pos,
+            *tag
+        )
@@ -4,18 +4,30 @@ sysimpactcv/runner.py
 Launch both baseline and attack runs for each seed, collect metrics, and
 dump CSVs with filenames data_<mode>_<seed>.csv, etc.
 """
-import argparse, os, shutil
-import xml.etree.ElementTree as ET
-from configparser import ConfigParser
+import argparse, csv, logging, os
+from concurrent.futures import ProcessPoolExecutor
+from configparser import ConfigParser, SectionProxy
+from contextlib import suppress
+from dataclasses import dataclass
+from functools import partial
+from itertools import repeat
 from pathlib import Path
 import random
 
-import traci
-import pandas as pd
+from traci import constants as tc
 
-from .attacks  import emergency_brake, rear_end_collision, lane_closure, rsu_spoofing
+from ._traci   import traci, LIBSUMO
+from .attacks  import (emergency_brake, rear_end_collision, lane_closure,
+                       rsu_spoofing, CAV_TYPE)
 from .sensors  import load_detectors
-from .metrics  import poll_detectors, poll_brakes, poll_collisions
+from .metrics  import (poll_detectors, poll_brakes, poll_collisions,
+                       track_vehicles, density_veh_km, subscribe_simulation,
+                       subscribe_detectors, detector_counts)
+
+logger = logging.getLogger(__name__)
+
+# write buffer for the streamed per-run CSVs
+CSV_BUFFER = 1 << 16
 
 # Map your attack keys to functions
 ATTACK_FN = {
@@ -26,6 +38,16 @@ ATTACK_FN = {
     # add new attack: "my_new_attack": my_new_attack_fn
 }
 
+# Refresh rate (Hz) at which attacks renew their pending 2 s lane-change
+# requests. The attack is still called every step, so stops, releases,
+# speed caps and each vehicle's first lane-change request are not delayed;
+# step_ctx['refresh'] only marks the steps to renew requests on.
+# Unlisted attacks refresh every step.
+ATTACK_STEP_HZ = {
+    "lane_closure":           1.0,
+    "scenario3-rsu-spoofing": 1.0,
+}
+
 def read_cfg(path: Path) -> ConfigParser:
     cfg = ConfigParser()
     cfg.optionxform = str   # preserve case
@@ -37,14 +59,278 @@ def absolute(path: str, base: Path) -> str:
     p = Path(path)
     return str(p if p.is_absolute() else base / p)
 
-def build_cmd(sumocfg: str, seed: int, add_files: str, use_gui: bool) -> list:
-    """Construct the TraCI command for SUMO."""
+def parse_vsl_schedule(sched_str: str) -> tuple:
+    """
+    Parse a 't0-t1:mph,…' schedule string into parallel tuples
+    (starts, ends, mphs), sorted by start time for bisect lookups.
+    """
+    schedule = []
+    for piece in sched_str.split(","):
+        rng, speed = piece.split(":")
+        start, end = map(float, rng.split("-"))
+        schedule.append((start, end, float(speed)))
+    schedule.sort()
+    starts, ends, mphs = zip(*schedule)
+    return starts, ends, mphs
+
+@dataclass(frozen=True, slots=True)
+class AttackCfg:
+    """
+    Typed view of a scenario's [attack] section, parsed once per run.
+
+    Keys an attack does not use stay None; vsl_schedule holds the
+    parse_vsl_schedule() arrays rather than the raw string.
+    """
+    type:                   str
+    ebrake_threshold:       float = -4.5
+    target_type:            str | None = None
+    target_vehicles:        str | None = None
+    vehicle_id:             str | None = None
+    stop_position:          float | None = None
+    emergency_deceleration: float = 9.0
+    aggressive_accel:       float | None = None
+    vsl_schedule:           tuple | None = None
+    lane_closure_start:     float | None = None
+    zone_min:               float | None = None
+    zone_max:               float | None = None
+    zone_edge:              str | None = None
+
+    @classmethod
+    def from_section(cls, sec: SectionProxy) -> "AttackCfg":
+        sched = sec.get("vsl_schedule", fallback=None)
+        return cls(
+            type                   = sec["type"],
+            ebrake_threshold       = sec.getfloat("ebrake_threshold", -4.5),
+            target_type            = sec.get("target_type", fallback=None),
+            target_vehicles        = sec.get("target_vehicles", fallback=None),
+            vehicle_id             = sec.get("vehicle_id", fallback=None),
+            stop_position          = sec.getfloat("stop_position"),
+            emergency_deceleration = sec.getfloat("emergency_deceleration", 9.0),
+            aggressive_accel       = sec.getfloat("aggressive_accel"),
+            vsl_schedule           = parse_vsl_schedule(sched) if sched else None,
+            lane_closure_start     = sec.getfloat("lane_closure_start"),
+            zone_min               = sec.getfloat("zone_min"),
+            zone_max               = sec.getfloat("zone_max"),
+            zone_edge              = sec.get("zone_edge", fallback=None),
+        )
+
+def build_attack_kwargs(attack_fn, acfg: AttackCfg, type_index, step_ctx) -> dict:
+    """Map the parsed [attack] values onto attack_fn's arguments for this run."""
+    if attack_fn is emergency_brake:
+        return dict(
+            vehicle_id             = acfg.vehicle_id,
+            stop_position          = acfg.stop_position,
+            emergency_deceleration = acfg.emergency_deceleration,
+            step_ctx               = step_ctx
+        )
+    if attack_fn is rear_end_collision:
+        return dict(
+            aggressive_accel = acfg.aggressive_accel,
+            target_type      = acfg.target_type,
+            target_vehicles  = acfg.target_vehicles,
+            vehicles         = type_index.get(acfg.target_type),
+            step_ctx         = step_ctx
+        )
+    if attack_fn is lane_closure:
+        return dict(
+            vehicles = type_index[acfg.target_type or CAV_TYPE],
+            step_ctx = step_ctx
+        )
+    if attack_fn is rsu_spoofing:
+        return dict(
+            vsl_sched    = acfg.vsl_schedule,
+            lane_close_t = acfg.lane_closure_start,
+            zone         = (acfg.zone_min, acfg.zone_max),
+            vehicles     = type_index[CAV_TYPE],
+            step_ctx     = step_ctx,
+            zone_edge    = acfg.zone_edge
+        )
+    # … add new attack arguments here …
+    return {}
+
+def _no_attack():
+    """Step hook for runs that do not inject an attack (e.g. baseline)."""
+
+def build_cmd(sumocfg: str, seed: int, add_files: str, use_gui: bool,
+              output_prefix: str = "", step_length: str | None = None) -> list:
+    """
+    Construct the TraCI command for SUMO.
+
+    `output_prefix`, when given, is prepended by SUMO to the file name of
+    every output (the E1 detector files as well as any output set in the
+    .sumocfg), keeping runs apart without editing XML.
+    `step_length` (s), when given, overrides the .sumocfg step length.
+    """
+    if use_gui and LIBSUMO:
+        raise ValueError("GUI=True needs the TraCI socket client; "
+                         "unset SUMO_LIBSUMO (libsumo has no sumo-gui)")
     bin_ = "sumo-gui" if use_gui else "sumo"
-    return [
+    cmd = [
         bin_, "-c", sumocfg,
         "--seed", str(seed),
         "--additional-files", add_files
     ]
+    if output_prefix:
+        cmd += ["--output-prefix", output_prefix]
+    if step_length:
+        cmd += ["--step-length", step_length]
+    return cmd
+
+def run_seed(cfg_dict: dict, scen_dir: Path, mode: str, seed: int,
+             lane_ids: list, *,
+             reload: bool = False, keep_open: bool = False) -> None:
+    """
+    Run one SUMO simulation for (mode, seed) and write its three CSVs.
+
+    Takes the scenario config as a plain {section: {key: value}} dict so it
+    can be shipped to a worker process. By default each call starts and
+    closes its own SUMO; with `reload` it resets the already running
+    instance via traci.load() instead, and `keep_open` leaves it running
+    for the next call (the caller then owns the final traci.close()).
+    """
+    cfg = ConfigParser()
+    cfg.optionxform = str   # preserve case
+    cfg.read_dict(cfg_dict)
+    sim     = cfg["simulation"]
+    det_cfg = cfg["detectors"]
+    acfg    = AttackCfg.from_section(cfg["attack"])
+    attack_type = acfg.type
+    attack_fn   = ATTACK_FN[attack_type]
+
+    logger.info("=== Mode '%s', Seed %d ===", mode, seed)
+
+    # ─ build & launch SUMO ────────────────────────────────────
+    sumocfg   = absolute(sim["sumoConfig_file"], scen_dir)
+    lane_xml  = absolute(det_cfg["additional_xml"], scen_dir)
+    e1_xml    = absolute(det_cfg.get("xml_template", "e1detectors.add.xml"), scen_dir)
+    add_files = f"{e1_xml},{lane_xml}"
+    # E1 output e1/<file> becomes e1/<mode>_<seed>_<file>
+    cmd       = build_cmd(sumocfg, seed, add_files,
+                          sim.getboolean("GUI", False), f"{mode}_{seed}_",
+                          sim.get("step_length"))
+    if reload:
+        logger.debug("Reloading: %s", " ".join(cmd[1:]))
+        traci.load(cmd[1:])
+    else:
+        logger.debug("Launching: %s", " ".join(cmd))
+        traci.start(cmd)
+    # (re)subscribe: a load starts a fresh simulation
+    subscribe_simulation()
+    subscribe_detectors(lane_ids)
+
+    # ─ init collectors ──────────────────────────────────────
+    state  = {}
+    # live vehicles + type-substring index, updated on depart/arrive
+    live, type_index = set(), {CAV_TYPE: set()}
+    if acfg.target_type:
+        type_index.setdefault(acfg.target_type, set())
+    # per-step context shared by attacks and metrics ('ids' is `live`,
+    # 'subs' the vehicle subscription results of this step)
+    step_ctx = {"ids": live, "sim_time": 0.0, "subs": {}, "refresh": True,
+                "collisions": (), "collisions_by_collider": {}}
+
+    # per-step attack call, specialised once: the attack with its arguments
+    # bound when this mode injects it, otherwise a no-op
+    if mode == attack_type:
+        tick = partial(attack_fn, state,
+                       **build_attack_kwargs(attack_fn, acfg, type_index, step_ctx))
+    else:
+        tick = _no_attack
+    ebrake_threshold = acfg.ebrake_threshold
+    end_time         = sim.getfloat("end_time")
+    # the step length SUMO actually runs with ([simulation] step_length or
+    # the .sumocfg); step-based rates below are derived from it
+    step_length      = traci.simulation.getDeltaT()
+    # poll the detectors once per simulated second
+    poll_every = max(1, round(1.0 / step_length))
+    # renew the attack's lasting commands every `refresh_every` steps
+    hz            = ATTACK_STEP_HZ.get(attack_type)
+    refresh_every = max(1, round(1.0 / (hz * step_length))) if hz else 1
+
+    tag          = (mode, seed)   # trailing columns of every row
+    STEP_COUNTER = 0
+
+    # ─ open CSV outputs; rows are streamed as they are produced ─
+    data_dir      = scen_dir / "data"
+    ebrake_dir    = scen_dir / "emergency"
+    collision_dir = scen_dir / "collision"
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    ebrake_dir.mkdir(parents=True, exist_ok=True)
+    collision_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(data_dir / f"data_{mode}_{seed}.csv", "w",
+              newline="", buffering=CSV_BUFFER) as det_f, \
+         open(ebrake_dir / f"ebrake_{mode}_{seed}.csv", "w",
+              newline="", buffering=CSV_BUFFER) as brake_f, \
+         open(collision_dir / f"coll_{mode}_{seed}.csv", "w",
+              newline="", buffering=CSV_BUFFER) as coll_f:
+        # "\n" line ends, byte-identical to the earlier pandas to_csv output
+        det_w, brake_w, coll_w = (csv.writer(f, lineterminator="\n")
+                                  for f in (det_f, brake_f, coll_f))
+        det_w.writerow(["time","det_id","veh_cnt","dens_veh_km","mode","seed"])
+        brake_w.writerow(["time","veh_id","acc_m_s2","mode","seed"])
+        coll_w.writerow(["time","collider","victim",
+                         "col_speed","vic_speed","lane","pos","mode","seed"])
+
+        # ─ simulation loop ──────────────────────────────────────
+        t = traci.simulation.getTime()
+        while t < end_time:
+            traci.simulationStep()
+            t = track_vehicles(live, type_index)[tc.VAR_TIME]
+            step_ctx["sim_time"] = t
+            step_ctx["subs"] = traci.vehicle.getAllSubscriptionResults()
+            # fetch this step's collisions once; index by collider (first wins)
+            collisions = traci.simulation.getCollisions()
+            by_collider = {}
+            for coll in collisions:
+                by_collider.setdefault(coll.collider, coll)
+            step_ctx["collisions"] = collisions
+            step_ctx["collisions_by_collider"] = by_collider
+            STEP_COUNTER += 1
+
+            step_ctx["refresh"] = STEP_COUNTER % refresh_every == 0
+            # an attack returns True once it has nothing left to do
+            if tick():
+                tick = _no_attack
+
+            # poll dets once/sec (every 10 steps if step_length=0.1)
+            if STEP_COUNTER % poll_every == 0:
+                counts = detector_counts(lane_ids)
+                det_w.writerows(zip(repeat(t), lane_ids, counts.tolist(),
+                                    density_veh_km(counts).tolist(),
+                                    repeat(mode), repeat(seed)))
+
+            # -- emergency brakes: rows already carry mode & seed --
+            brake_w.writerows(poll_brakes(ebrake_threshold, step_ctx, tag))
+
+            # -- collisions: rows already carry mode & seed --
+            coll_w.writerows(poll_collisions(step_ctx, tag))
+
+    if not keep_open:
+        traci.close()
+
+    logger.info("Completed mode='%s', seed=%d", mode, seed)
+
+def run_batch(cfg_dict: dict, scen_dir: Path, runs: list, lane_ids: list) -> None:
+    """
+    Run a batch of (mode, seed) runs on a single SUMO instance.
+
+    SUMO is started for the first run and traci.load()ed for the rest, and
+    always closed at the end (also on error), so its outputs are finalized.
+    Used for the sequential sweep and as the entry point of pool workers.
+    """
+    try:
+        for i, (mode, seed) in enumerate(runs):
+            run_seed(cfg_dict, scen_dir, mode, seed, lane_ids,
+                     reload=i > 0, keep_open=True)
+    except BaseException:
+        # best-effort close: SUMO may never have started (e.g. a bad
+        # sumoConfig_file), and "Not connected" must not hide the real error
+        with suppress(Exception):
+            traci.close()
+        raise
+    traci.close()
 
 def main():
     # ─── parse CLI ────────────────────────────────────────────
@@ -53,8 +339,28 @@ def main():
         "-s","--scenario", required=True,
         help="Name of the scenario folder under ./scenarios/"
     )
+    ap.add_argument(
+        "-j","--jobs", type=int, default=None,
+        help="Number of runs to simulate in parallel (one SUMO process each); "
+             "defaults to [simulation] workers, 0 = all cores"
+    )
+    ap.add_argument(
+        "-v","--verbose", action="count", default=0,
+        help="-v logs per-run progress, -vv also SUMO launches and attack events"
+    )
+    ap.add_argument(
+        "--log-file", default=None,
+        help="Write log messages to this file instead of stderr"
+    )
     args = ap.parse_args()
 
+    # WARNING unless raised by -v/-vv or LOGLEVEL (e.g. LOGLEVEL=DEBUG)
+    if args.verbose:
+        level = logging.DEBUG if args.verbose > 1 else logging.INFO
+    else:
+        level = os.environ.get("LOGLEVEL", "WARNING").upper()
+    logging.basicConfig(level=level, filename=args.log_file)
+
     repo_root = Path(__file__).resolve().parent.parent
     scen_dir  = repo_root / "scenarios" / args.scenario
     cfg_path  = scen_dir / "scenario.ini"
@@ -67,9 +373,10 @@ def main():
     det_cfg = cfg["detectors"]
     atk_cfg = cfg["attack"]
     attack_type = atk_cfg["type"]
-    attack_fn   = ATTACK_FN.get(attack_type)
     if attack_type not in ATTACK_FN:
         raise ValueError(f"Attack '{attack_type}' not implemented")
+    # plain-dict copy of the INI, picklable for worker processes
+    cfg_dict = {name: dict(cfg[name]) for name in cfg.sections()}
 
     # ─── determine run modes ──────────────────────────────────
     # default runs: baseline + whatever attack_type is
@@ -90,126 +397,30 @@ def main():
         raise ValueError(f"seed_count ({seed_count}) > max available seeds ({MAX_SEED})")
 
     seeds = random.sample(range(1, MAX_SEED+1), seed_count)
-    print("▶ Using random seeds:", seeds)
-
-    for mode in modes:
-        for seed in seeds:
-            print(f"\n=== Mode '{mode}', Seed {seed} ===")
-
-            # ─── ensure the output folder for E1 detectors exists ─────────────────
-            e1_dir = scen_dir / "e1"
-            e1_dir.mkdir(parents=True, exist_ok=True)
-
-            # ─ prepare & patch E1 detector file ───────────────
-            orig_e1 = scen_dir / "e1detectors.add.xml"
-            mod_e1  = scen_dir / f"e1detectors_{mode}_{seed}.add.xml"
-            shutil.copy(orig_e1, mod_e1)
-            tree = ET.parse(mod_e1)
-            for e in tree.getroot().findall("e1Detector"):
-                # send output to e1/e1detectors_<mode>_<seed>.xml
-                e.set("file", f"e1/e1detectors_{mode}_{seed}.xml")
-            tree.write(mod_e1)
-
-            # ─ build & launch SUMO ────────────────────────────
-            sumocfg   = absolute(sim["sumoConfig_file"], scen_dir)
-            add_files = f"{mod_e1},{lane_xml}"
-            cmd       = build_cmd(sumocfg, seed, add_files,
-                                  sim.getboolean("GUI", False))
-            print("Launching:", " ".join(cmd))
-            traci.start(cmd)
-
-            # ─ init collectors ──────────────────────────────────
-            state  = {}
-            det_rows, brake_rows, coll_rows = [], [], []
-            STEP_COUNTER = 0
-            end_time     = sim.getfloat("end_time")
-
-            # ─ simulation loop ──────────────────────────────────
-            while traci.simulation.getTime() < end_time:
-                traci.simulationStep()
-                t = traci.simulation.getTime()
-                STEP_COUNTER += 1
-
-                # only inject when mode matches the attack
-                if mode == attack_type:
-                    if attack_type == "emergency_brake":
-                        attack_fn(
-                            state,
-                            vehicle_id   = atk_cfg["vehicle_id"],
-                            stop_position= atk_cfg.getfloat("stop_position")
-                        )
-                    elif attack_type == "rear_end":
-                        attack_fn(
-                            state,
-                            aggressive_accel = atk_cfg.getfloat("aggressive_accel"),
-                            target_type      = atk_cfg.get("target_type", fallback=None),
-                            target_vehicles  = atk_cfg.get("target_vehicles", fallback=None)
-                        )
-                    elif attack_type == "lane_closure":
-                        attack_fn(
-                            state,
-                            target_type = atk_cfg["target_type"]
-                        )
-                    elif attack_type == "rsu_spoofing":
-                        sched_str = cfg["attack"]["vsl_schedule"]
-                        schedule  = []
-                        for piece in sched_str.split(","):
-                            rng,speed = piece.split(":")
-                            start,end = map(float, rng.split("-"))
-                            schedule.append((start, end, float(speed)))
-                        lane_start = cfg["attack"].getfloat("lane_closure_start")
-                        zmin = cfg["attack"].getfloat("zone_min")
-                        zmax = cfg["attack"].getfloat("zone_max")
-                        attack_fn(state,
-                                vsl_sched=schedule,
-                                lane_close_t=lane_start,
-                                zone=(zmin, zmax))
-                    # … add new attack dispatch here …
-
-                # poll dets once/sec (every 10 steps if step_length=0.1)
-                if STEP_COUNTER % 10 == 0:
-                    for det_id in lane_ids:
-                        cnt = traci.lanearea.getLastStepVehicleNumber(det_id)
-                        dens_km = (cnt/100.0)*1000.0
-                        det_rows.append((t, det_id, cnt, dens_km, mode, seed))
-
-                # -- emergency brakes: extend each row with mode & seed --
-                for t, vid, acc in poll_brakes(cfg["attack"].getfloat("ebrake_threshold", -4.5)):
-                    brake_rows.append((t, vid, acc, mode, seed))
-
-                # -- collisions: extend each row with mode & seed --
-                for t, col, vic, cs, vs, lane, pos in poll_collisions():
-                    coll_rows.append((t, col, vic, cs, vs, lane, pos, mode, seed))
-
-
-
-            traci.close()
-            os.remove(mod_e1)
-
-            # ─ write CSVs ───────────────────────────────────────
-            data_dir      = scen_dir / "data"
-            ebrake_dir    = scen_dir / "emergency"
-            collision_dir = scen_dir / "collision"
-
-            data_dir.mkdir(parents=True, exist_ok=True)
-            ebrake_dir.mkdir(parents=True, exist_ok=True)
-            collision_dir.mkdir(parents=True, exist_ok=True)
-
-            pd.DataFrame(det_rows,
-                        columns=["time","det_id","veh_cnt","dens_veh_km","mode","seed"]
-                        ).to_csv(data_dir / f"data_{mode}_{seed}.csv", index=False)
-
-            pd.DataFrame(brake_rows,
-                        columns=["time","veh_id","acc_m_s2","mode","seed"]
-                        ).to_csv(ebrake_dir / f"ebrake_{mode}_{seed}.csv", index=False)
-
-            pd.DataFrame(coll_rows,
-                        columns=["time","collider","victim",
-                                "col_speed","vic_speed","lane","pos","mode","seed"]
-                        ).to_csv(collision_dir / f"coll_{mode}_{seed}.csv", index=False)
-
-
-            print(f"Completed mode='{mode}', seed={seed}")
+    logger.info("Using random seeds: %s", seeds)
+
+    # E1 outputs go to e1/, namespaced per run by SUMO's --output-prefix
+    (scen_dir / "e1").mkdir(parents=True, exist_ok=True)
+
+    runs = [(mode, seed) for mode in modes for seed in seeds]
+    jobs = args.jobs if args.jobs is not None else sim.getint("workers", 1)
+    jobs = min(jobs or os.cpu_count(), len(runs))
+
+    if jobs <= 1:
+        # sequential: start SUMO once and traci.load() it for every later run
+        run_batch(cfg_dict, scen_dir, runs, lane_ids)
+        return
+
+    # runs are independent: deal the whole mode × seed sweep into one batch
+    # per worker; each batch runs on its own SUMO (traci.start picks a free
+    # port per instance), reloaded between runs and closed at the end
+    with ProcessPoolExecutor(max_workers=jobs) as ex:
+        futures = [
+            ex.submit(run_batch, cfg_dict, scen_dir, runs[w::jobs], lane_ids)
+            for w in range(jobs)
+        ]
+        for fut in futures:
+            fut.result()   # re-raise worker errors
 
 if __name__ == "__main__":
     main()
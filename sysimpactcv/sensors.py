@@ -1,16 +1,30 @@
 # sysimpactcv/sensors.py
+import os
 import xml.etree.ElementTree as ET
 
+# (path, mtime) -> detector IDs, so an unchanged file is parsed only once
+_DETECTOR_CACHE = {}
+
 def load_detectors(add_xml_path):
     """
     Parse a SUMO additional‐files XML and return all laneAreaDetector IDs.
+
+    The file is streamed with iterparse and every element is cleared once
+    read, so no tree of the other elements (e1 detectors, polygons, …) is
+    kept. Results are cached per (path, mtime).
     
     Args:
       add_xml_path (str): path to the <additional-files> .add.xml file
     Returns:
       List[str]: list of detector IDs to poll each timestep
     """
-    tree = ET.parse(add_xml_path)
-    root = tree.getroot()
-    return [elem.attrib["id"] for elem in root.findall("laneAreaDetector")]
-
+    key = (add_xml_path, os.path.getmtime(add_xml_path))
+    ids = _DETECTOR_CACHE.get(key)
+    if ids is None:
+        ids = []
+        for _, elem in ET.iterparse(add_xml_path, events=("end",)):
+            if elem.tag == "laneAreaDetector":
+                ids.append(elem.attrib["id"])
+            elem.clear()
+        _DETECTOR_CACHE[key] = ids
+    return list(ids)